@@ -27,7 +27,7 @@ Credentials
 Use of this plugin requires a configuration file containing the target DNS
 server and optional port that supports RFC 2136 Dynamic Updates, the name
 of the TSIG key, the TSIG key secret itself, the algorithm used if it's
-different to HMAC-MD5, and optionally whether to sign the initial SOA query.
+different to HMAC-SHA256, and optionally whether to sign the initial SOA query.
 
 .. code-block:: ini
    :name: credentials.ini
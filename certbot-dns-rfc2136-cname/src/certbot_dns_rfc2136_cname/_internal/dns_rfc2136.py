@@ -1,8 +1,13 @@
 """DNS Authenticator using RFC 2136 Dynamic Updates."""
+import functools
 import logging
-from typing import Any, Union
+import socket
+from time import sleep
+from typing import Any
 from typing import Callable
 from typing import cast
+from typing import List
+from typing import Literal
 from typing import Optional
 
 import dns.flags
@@ -16,7 +21,10 @@ import dns.tsig
 import dns.tsigkeyring
 import dns.update
 
+from acme import challenges
+from certbot import achallenges
 from certbot import errors
+from certbot.display import util as display_util
 from certbot.plugins import dns_common
 from certbot.plugins.dns_common import CredentialsConfiguration
 from certbot.util import is_ipaddress
@@ -24,6 +32,14 @@ from certbot.util import is_ipaddress
 logger = logging.getLogger(__name__)
 
 DEFAULT_NETWORK_TIMEOUT = 45
+# CNAME chains longer than this are very rare, so "auto" depth stops following them here
+AUTO_CNAME_DEPTH = 6
+
+
+@functools.lru_cache(maxsize=1024)
+def _name(text: str) -> dns.name.Name:
+    """Parse a domain name, reusing the result for names seen before (Names are immutable)."""
+    return dns.name.from_text(text)
 
 
 class Authenticator(dns_common.DNSAuthenticator):
@@ -50,7 +66,10 @@ class Authenticator(dns_common.DNSAuthenticator):
         super().__init__(*args, **kwargs)
         self.credentials: Optional[CredentialsConfiguration] = None
         self.follow: bool = False
-        self.depth: Union[int, str] = 1
+        self.depth: int = 1
+        self._algorithm: dns.name.Name = dns.tsig.HMAC_SHA256
+        self._sign_query: bool = False
+        self._client: Optional[_RFC2136Client] = None
 
     @classmethod
     def add_parser_arguments(cls, add: Callable[..., None],
@@ -85,50 +104,110 @@ class Authenticator(dns_common.DNSAuthenticator):
             },
             self._validate_credentials
         )
+        algorithm: str = (self.credentials.conf('algorithm') or '').upper()
+        self._algorithm = self.ALGORITHMS.get(algorithm, dns.tsig.HMAC_SHA256)
+        self._sign_query = (self.credentials.conf('sign_query') or '').upper() == "TRUE"
+        self._parse_config()
 
-    def _perform(self, _domain: str, validation_name: str, validation: str) -> None:
-        follow_conf = self.conf('follow')
-        if not follow_conf is None:
-            self.follow = follow_conf
+    def perform(self, achalls: List[achallenges.AnnotatedChallenge]
+                ) -> List[challenges.ChallengeResponse]:
+        self._setup_credentials()
+
+        self._attempt_cleanup = True
+
+        records = []
+        responses = []
+        for achall in achalls:
+            validation_domain_name = achall.validation_domain_name(achall.domain)
+            records.append((validation_domain_name, achall.validation(achall.account_key)))
+            responses.append(achall.response(achall.account_key))
+
+        # Send the records of each zone in a single update
+        client = self._get_rfc2136_client()
+        try:
+            client.add_txt_records(records, self.ttl)
+        finally:
+            client.close()
+
+        display_util.notify("Waiting %d seconds for DNS changes to propagate" %
+                            self.conf('propagation-seconds'))
+        sleep(self.conf('propagation-seconds'))
+
+        return responses
+
+    def cleanup(self, achalls: List[achallenges.AnnotatedChallenge]) -> None:
+        if self._attempt_cleanup:
+            records = []
+            for achall in achalls:
+                validation_domain_name = achall.validation_domain_name(achall.domain)
+                records.append((validation_domain_name, achall.validation(achall.account_key)))
+
+            client = self._get_rfc2136_client()
+            try:
+                client.del_txt_records(records)
+            finally:
+                client.close()
+
+    def _parse_config(self) -> None:
+        self.follow = bool(self.conf('follow'))
 
         depth_conf = self.conf('depth')
-        if not depth_conf is None:
-            if depth_conf.lower() == 'auto':
-                self.depth = 'auto'
-            else:
-                try:
-                    depth_int = int(depth_conf)
-                    if depth_int < 1:
-                        raise errors.PluginError("CNAME depth must be >=1 or 'auto'.")
-                    self.depth = depth_int
-                except ValueError:
-                    raise errors.PluginError("Invalid value for CNAME depth: must be an integer or 'auto'.")
+        if depth_conf is None:
+            return
+        if str(depth_conf).lower() == 'auto':
+            self.depth = AUTO_CNAME_DEPTH
+            return
+        try:
+            depth = int(depth_conf)
+        except ValueError:
+            raise errors.PluginError("Invalid value for CNAME depth: must be an integer or 'auto'.")
+        if depth < 1:
+            raise errors.PluginError("CNAME depth must be >=1 or 'auto'.")
+        self.depth = depth
 
-        self._get_rfc2136_client().add_txt_record(validation_name, validation, self.ttl)
+    def _perform(self, _domain: str, validation_name: str, validation: str) -> None:
+        client = self._get_rfc2136_client()
+        try:
+            client.add_txt_record(validation_name, validation, self.ttl)
+        finally:
+            client.close()
 
     def _cleanup(self, _domain: str, validation_name: str, validation: str) -> None:
-        self._get_rfc2136_client().del_txt_record(validation_name, validation)
+        client = self._get_rfc2136_client()
+        try:
+            client.del_txt_record(validation_name, validation)
+        finally:
+            client.close()
 
     def _get_rfc2136_client(self) -> "_RFC2136Client":
         if not self.credentials:  # pragma: no cover
             raise errors.Error("Plugin has not been prepared.")
 
-        algorithm: str = (self.credentials.conf('algorithm') or '').upper()
+        # Reuse the client, and with it its caches, for every challenge
+        if self._client is not None:
+            return self._client
 
-        return _RFC2136Client(cast(str, self.credentials.conf('server')),
-                              int(cast(str, self.credentials.conf('port')) or self.PORT),
-                              cast(str, self.credentials.conf('name')),
-                              cast(str, self.credentials.conf('secret')),
-                              self.ALGORITHMS.get(algorithm, dns.tsig.HMAC_MD5),
-                              (self.credentials.conf('sign_query') or '').upper() == "TRUE",
-                              self.follow,
-                              (0 if self.depth == "auto" else self.depth))
+        self._client = _RFC2136Client(
+            cast(str, self.credentials.conf('server')),
+            int(cast(str, self.credentials.conf('port')) or self.PORT),
+            cast(str, self.credentials.conf('name')),
+            cast(str, self.credentials.conf('secret')),
+            self._algorithm,
+            self._sign_query,
+            self.follow,
+            self.depth)
+        return self._client
 
 
 class _RFC2136Client:
     """
     Encapsulates all communication with the target DNS server.
     """
+
+    __slots__ = ('server', 'port', 'keyring', 'algorithm', 'sign_query', 'cname_follow',
+                 'cname_depth', '_default_timeout', '_tcp_sock', '_soa_cache', '_zone_cache',
+                 '_resolver')
+
     def __init__(self, server: str, port: int, key_name: str, key_secret: str,
                  key_algorithm: dns.name.Name, sign_query: bool,
                  cname_follow: bool, cname_depth: int,
@@ -143,6 +222,22 @@ class _RFC2136Client:
         self.cname_follow = cname_follow
         self.cname_depth = cname_depth
         self._default_timeout = timeout
+        # Authoritative SOA lookups, keyed by lowercased domain name
+        self._soa_cache: dict[str, bool] = {}
+        # Resolved (zone, record name) pairs, keyed by the requested record name
+        self._zone_cache: dict[str, tuple[str, str]] = {}
+        # Connection reused for all TCP queries and updates
+        self._tcp_sock: Optional[socket.socket] = None
+        # Resolver used to follow CNAMEs, created on first use
+        self._resolver: Optional[dns.resolver.Resolver] = None
+
+    def close(self) -> None:
+        """
+        Close the TCP connection to the target DNS server, if one is open.
+        """
+        if self._tcp_sock is not None:
+            self._tcp_sock.close()
+            self._tcp_sock = None
 
     def add_txt_record(self, record_name: str, record_content: str, record_ttl: int) -> None:
         """
@@ -153,31 +248,7 @@ class _RFC2136Client:
         :param int record_ttl: The record TTL (number of seconds that the record may be cached).
         :raises certbot.errors.PluginError: if an error occurs communicating with the DNS server
         """
-
-        domain, record_name = self._find_domain(record_name)
-
-        n = dns.name.from_text(record_name)
-        o = dns.name.from_text(domain)
-        rel = n.relativize(o)
-
-        update = dns.update.Update(
-            domain,
-            keyring=self.keyring,
-            keyalgorithm=self.algorithm)
-        update.add(rel, record_ttl, dns.rdatatype.TXT, record_content)
-
-        try:
-            response = dns.query.tcp(update, self.server, self._default_timeout, self.port)
-        except Exception as e:
-            raise errors.PluginError('Encountered error adding TXT record: {0}'
-                                     .format(e))
-        rcode = response.rcode()
-
-        if rcode == dns.rcode.NOERROR:
-            logger.debug('Successfully added TXT record %s', record_name)
-        else:
-            raise errors.PluginError('Received response from server: {0}'
-                                     .format(dns.rcode.to_text(rcode)))
+        self._send_update('add', [(record_name, record_content)], record_ttl)
 
     def del_txt_record(self, record_name: str, record_content: str) -> None:
         """
@@ -185,35 +256,137 @@ class _RFC2136Client:
 
         :param str record_name: The record name (typically beginning with '_acme-challenge.').
         :param str record_content: The record content (typically the challenge validation).
+        :raises certbot.errors.PluginError: if an error occurs communicating with the DNS server
+        """
+        self._send_update('del', [(record_name, record_content)])
+
+    def add_txt_records(self, records: List[tuple[str, str]], record_ttl: int) -> None:
+        """
+        Add several TXT records, sending a single update for each zone.
+
+        :param list records: The (record name, record content) pairs to add.
         :param int record_ttl: The record TTL (number of seconds that the record may be cached).
         :raises certbot.errors.PluginError: if an error occurs communicating with the DNS server
         """
+        self._send_update('add', records, record_ttl)
 
-        domain, record_name = self._find_domain(record_name)
+    def del_txt_records(self, records: List[tuple[str, str]]) -> None:
+        """
+        Delete several TXT records, sending a single update for each zone.
 
-        n = dns.name.from_text(record_name)
-        o = dns.name.from_text(domain)
-        rel = n.relativize(o)
+        :param list records: The (record name, record content) pairs to delete.
+        :raises certbot.errors.PluginError: if an error occurs communicating with the DNS server
+        """
+        self._send_update('del', records)
+
+    def _send_update(self, op: Literal['add', 'del'], records: List[tuple[str, str]],
+                     record_ttl: Optional[int] = None) -> None:
+        """
+        Add or delete TXT records, sending a single update for each zone.
+
+        If the update for a zone fails, the cached lookups that led to that zone are dropped.
+
+        :param str op: ``'add'`` to add the records, ``'del'`` to delete them.
+        :param list records: The (record name, record content) pairs to update.
+        :param int record_ttl: The record TTL, only used when adding records.
+        :raises certbot.errors.PluginError: if an error occurs communicating with the DNS server
+        """
 
+        for domain, zone_records in self._group_by_zone(records).items():
+            try:
+                self._update_zone(op, domain, zone_records, record_ttl)
+            except errors.PluginError:
+                # The zone may have been wrong, look it up again next time
+                self._forget_zone(domain, zone_records)
+                raise
+
+    def _update_zone(self, op: Literal['add', 'del'], domain: str,
+                     zone_records: List[tuple[str, str, str]],
+                     record_ttl: Optional[int] = None) -> None:
+        """
+        Add or delete TXT records of one zone in a single update.
+
+        If the server refuses an update for several records, they are sent one at a time. Every
+        record is tried, and any failures are reported together afterwards.
+
+        :param str op: ``'add'`` to add the records, ``'del'`` to delete them.
+        :param str domain: The zone the records belong to.
+        :param list zone_records: The (record name, resolved record name, record content) triples.
+        :param int record_ttl: The record TTL, only used when adding records.
+        :raises certbot.errors.PluginError: if an error occurs communicating with the DNS server
+        """
+
+        action, done = ('adding', 'added') if op == 'add' else ('deleting', 'deleted')
+
+        o = _name(domain)
         update = dns.update.Update(
-            domain,
+            o,
             keyring=self.keyring,
             keyalgorithm=self.algorithm)
-        update.delete(rel, dns.rdatatype.TXT, record_content)
+        for _, record_name, record_content in zone_records:
+            rel = _name(record_name).relativize(o)
+            if op == 'add':
+                update.add(rel, record_ttl, dns.rdatatype.TXT, record_content)
+            else:
+                update.delete(rel, dns.rdatatype.TXT, record_content)
 
         try:
-            response = dns.query.tcp(update, self.server, self._default_timeout, self.port)
+            response = self._send_tcp(update)
         except Exception as e:
-            raise errors.PluginError('Encountered error deleting TXT record: {0}'
-                                     .format(e))
+            raise errors.PluginError('Encountered error {0} TXT record: {1}'
+                                     .format(action, e))
         rcode = response.rcode()
 
         if rcode == dns.rcode.NOERROR:
-            logger.debug('Successfully deleted TXT record %s', record_name)
+            logger.debug('Successfully %s TXT record %s', done,
+                         ', '.join(record_name for _, record_name, _ in zone_records))
+        elif rcode == dns.rcode.REFUSED and len(zone_records) > 1:
+            logger.debug('Update for %s refused, %s TXT records one at a time', domain, action)
+            failures = []
+            for requested_name, _, record_content in zone_records:
+                try:
+                    self._send_update(op, [(requested_name, record_content)], record_ttl)
+                except errors.PluginError as e:
+                    failures.append('{0}: {1}'.format(requested_name, e))
+            if failures:
+                raise errors.PluginError('Encountered errors {0} TXT records: {1}'
+                                         .format(action, '; '.join(failures)))
         else:
             raise errors.PluginError('Received response from server: {0}'
                                      .format(dns.rcode.to_text(rcode)))
 
+    def _forget_zone(self, domain: str, zone_records: List[tuple[str, str, str]]) -> None:
+        """
+        Drop the cached lookups that led to a zone, so it is looked up again.
+
+        :param str domain: The zone the records were found in.
+        :param list zone_records: The (record name, resolved record name, record content) triples.
+        """
+
+        for requested_name, record_name, _ in zone_records:
+            self._zone_cache.pop(requested_name, None)
+            for guess in dns_common.base_domain_name_guesses(record_name):
+                self._soa_cache.pop(guess.lower(), None)
+                if guess.lower() == domain.lower():
+                    break
+
+    def _group_by_zone(self, records: List[tuple[str, str]]
+                       ) -> dict[str, List[tuple[str, str, str]]]:
+        """
+        Group records by the authoritative zone they belong to.
+
+        :param list records: The (record name, record content) pairs to group.
+        :returns: For each zone, the (record name, resolved record name, record content) triples.
+        :rtype: dict
+        :raises certbot.errors.PluginError: if no SOA record can be found for a record name.
+        """
+
+        zones: dict[str, List[tuple[str, str, str]]] = {}
+        for requested_name, record_content in records:
+            domain, record_name = self._find_domain(requested_name)
+            zones.setdefault(domain, []).append((requested_name, record_name, record_content))
+        return zones
+
     def _find_domain(self, record_name: str) -> tuple[str, str]:
         """
         Find the authoritative zone for a given record name.
@@ -224,26 +397,34 @@ class _RFC2136Client:
         :raises certbot.errors.PluginError: if no SOA record can be found.
         """
 
+        if record_name in self._zone_cache:
+            return self._zone_cache[record_name]
+
+        requested_name = record_name
+
         # Follow CNAMEs to find the correct base domain
 
         if self.cname_follow:
-            visited = set()
+            visited: set[dns.name.Name] = set()
             hops = 0
 
             while True:
-                if record_name in visited:
+                # Names compare case-insensitively and regardless of a trailing dot
+                key = _name(record_name)
+                if key in visited:
                     raise errors.PluginError(f"CNAME loop detected at {record_name}")
 
-                visited.add(record_name)
+                visited.add(key)
 
                 try:
-                    answers = dns.resolver.resolve(record_name, 'CNAME')
-                    target = str(answers[0].target).rstrip('.')
+                    answers = self._get_resolver().resolve(record_name, 'CNAME',
+                                                           raise_on_no_answer=True)
+                    target = str(answers[0].target).rstrip('.').lower()
                     logger.debug(f"Following CNAME: {record_name} -> {target}")
                     record_name = target
                     hops += 1
 
-                    if 0 < self.cname_depth < hops:
+                    if self.cname_depth and hops > self.cname_depth:
                         raise errors.PluginError(f"Reached maximum CNAME depth ({self.cname_depth}).")
 
                 except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN, dns.resolver.LifetimeTimeout,
@@ -260,11 +441,73 @@ class _RFC2136Client:
         # Loop through until we find an authoritative SOA record
         for guess in domain_name_guesses:
             if self._query_soa(guess):
+                self._zone_cache[requested_name] = (guess, record_name)
                 return guess, record_name
 
         raise errors.PluginError('Unable to determine base domain for {0} using names: {1}.'
                                  .format(record_name, domain_name_guesses))
 
+    def _get_resolver(self) -> dns.resolver.Resolver:
+        """
+        Get the resolver used to follow CNAMEs, creating it from the system configuration.
+
+        Answers are cached across challenges. Each hop gets a share of the overall timeout so
+        one slow nameserver can't stall the whole chain.
+
+        :returns: The resolver.
+        :rtype: dns.resolver.Resolver
+        :raises dns.resolver.NoResolverConfiguration: if no nameservers are configured.
+        """
+
+        if self._resolver is None:
+            resolver = dns.resolver.Resolver()
+            resolver.cache = dns.resolver.LRUCache(max_size=256)
+            resolver.lifetime = max(2.0, self._default_timeout / max(self.cname_depth,
+                                                                     AUTO_CNAME_DEPTH))
+            resolver.timeout = min(2.0, resolver.lifetime)
+            self._resolver = resolver
+        return self._resolver
+
+    def _send_tcp(self, message: dns.message.Message) -> dns.message.Message:
+        """
+        Send a message over the persistent TCP connection, opening it if necessary.
+
+        If the server has closed a previously opened connection, it is re-established once.
+
+        :param dns.message.Message message: The query or update to send.
+        :returns: The server's response.
+        :rtype: dns.message.Message
+        """
+
+        if self._tcp_sock is not None:
+            try:
+                return self._query_tcp(message)
+            except (EOFError, ConnectionError) as e:
+                logger.debug('TCP connection to %s lost, reconnecting: %s', self.server, e)
+
+        self._tcp_sock = socket.create_connection((self.server, self.port), self._default_timeout)
+        self._tcp_sock.setblocking(False)
+        return self._query_tcp(message)
+
+    def _query_tcp(self, message: dns.message.Message) -> dns.message.Message:
+        """
+        Send a message over the currently open TCP connection.
+
+        The connection is closed on any failure, so it is never reused in an unknown state.
+
+        :param dns.message.Message message: The query or update to send.
+        :returns: The server's response.
+        :rtype: dns.message.Message
+        """
+
+        try:
+            return dns.query.tcp(message, self.server, self._default_timeout, self.port,
+                                 sock=self._tcp_sock)
+        except Exception:
+            # The connection is in an unknown state, don't reuse it
+            self.close()
+            raise
+
     def _query_soa(self, domain_name: str) -> bool:
         """
         Query a domain name for an authoritative SOA record.
@@ -275,21 +518,19 @@ class _RFC2136Client:
         :raises certbot.errors.PluginError: if no response is received.
         """
 
-        domain = dns.name.from_text(domain_name)
+        if domain_name.lower() in self._soa_cache:
+            return self._soa_cache[domain_name.lower()]
 
-        request = dns.message.make_query(domain, dns.rdatatype.SOA, dns.rdataclass.IN)
-        # Turn off Recursion Desired bit in query
-        request.flags ^= dns.flags.RD
+        domain = _name(domain_name)
+
+        # Build the query without the Recursion Desired bit
+        request = dns.message.make_query(domain, dns.rdatatype.SOA, dns.rdataclass.IN, flags=0)
         # Use our TSIG keyring if configured
         if self.sign_query:
             request.use_tsig(self.keyring, algorithm=self.algorithm)
 
         try:
-            try:
-                response = dns.query.tcp(request, self.server, self._default_timeout, self.port)
-            except (OSError, dns.exception.Timeout) as e:
-                logger.debug('TCP query failed, fallback to UDP: %s', e)
-                response = dns.query.udp(request, self.server, self._default_timeout, self.port)
+            response = self._send_tcp(request)
             rcode = response.rcode()
 
             # Authoritative Answer bit should be set
@@ -298,10 +539,42 @@ class _RFC2136Client:
                                            domain, dns.rdataclass.IN, dns.rdatatype.SOA)
                     and response.flags & dns.flags.AA):
                 logger.debug('Received authoritative SOA response for %s', domain_name)
+                self._soa_cache[domain_name.lower()] = True
                 return True
 
+            # An answer section (e.g. a CNAME chased by the server) means the authority SOA may
+            # belong to another zone than the queried name's
+            if (rcode in (dns.rcode.NOERROR, dns.rcode.NXDOMAIN)
+                    and response.flags & dns.flags.AA and not response.answer):
+                self._cache_enclosing_zone(domain, response)
+
             logger.debug('No authoritative SOA record found for %s', domain_name)
+            self._soa_cache[domain_name.lower()] = False
             return False
         except Exception as e:
             raise errors.PluginError('Encountered error when making query: {0}'
                                      .format(e))
+
+    def _cache_enclosing_zone(self, domain: dns.name.Name, response: dns.message.Message) -> None:
+        """
+        Remember the zone named by the SOA record of an authoritative negative response.
+
+        Only responses with an empty answer section may be passed in. Such a response means the
+        queried name lies inside that zone, so neither it nor any name between it and the zone apex
+        is an apex itself. Caching this lets `_find_domain` settle its remaining guesses without
+        querying the server again.
+
+        :param dns.name.Name domain: The domain name that was queried.
+        :param dns.message.Message response: The authoritative response without any answer.
+        """
+
+        for rrset in response.authority:
+            if (rrset.rdtype == dns.rdatatype.SOA and rrset.rdclass == dns.rdataclass.IN
+                    and domain.is_subdomain(rrset.name) and domain != rrset.name):
+                name = domain.parent()
+                while name != rrset.name:
+                    self._soa_cache[name.to_text(omit_final_dot=True).lower()] = False
+                    name = name.parent()
+                self._soa_cache[rrset.name.to_text(omit_final_dot=True).lower()] = True
+                logger.debug('%s belongs to zone %s', domain, rrset.name)
+                return
@@ -5,7 +5,11 @@ import unittest
 from unittest import mock
 
 import dns.flags
+import dns.message
 import dns.rcode
+import dns.rdataclass
+import dns.rdatatype
+import dns.rrset
 import dns.tsig
 import pytest
 
@@ -34,6 +38,8 @@ class AuthenticatorTest(test_util.TempDirTestCase, dns_test_common.BaseAuthentic
         dns_test_common.write(VALID_CONFIG, path)
 
         self.config = mock.MagicMock(rfc2136_credentials=path,
+                                     rfc2136_follow=False,
+                                     rfc2136_depth=None,
                                      rfc2136_propagation_seconds=0)  # don't wait during tests
 
         self.auth = Authenticator(self.config, "rfc2136")
@@ -49,17 +55,72 @@ class AuthenticatorTest(test_util.TempDirTestCase, dns_test_common.BaseAuthentic
         # algorithm and sign_query are intentionally absent to test that the default (None)
         # value does not crash Certbot.
         creds = { "server": SERVER, "port": PORT, "name": NAME, "secret": SECRET }
-        self.auth.credentials = mock.MagicMock()
-        self.auth.credentials.conf = lambda key: creds.get(key, None)
+        credentials = mock.MagicMock()
+        credentials.conf = lambda key: creds.get(key, None)
+        with mock.patch.object(self.auth, '_configure_credentials', return_value=credentials):
+            # _setup_credentials | pylint: disable=protected-access
+            self.auth._setup_credentials()
         client = self.orig_get_client()
-        assert client.algorithm == self.auth.ALGORITHMS["HMAC-MD5"]
+        assert client.algorithm == self.auth.ALGORITHMS["HMAC-SHA256"]
         assert client.sign_query is False
 
+    def test_get_client_conf_values(self):
+        creds = { "server": SERVER, "port": PORT, "name": NAME, "secret": SECRET,
+                  "algorithm": "hmac-md5", "sign_query": "true" }
+        credentials = mock.MagicMock()
+        credentials.conf = lambda key: creds.get(key, None)
+        with mock.patch.object(self.auth, '_configure_credentials', return_value=credentials):
+            # _setup_credentials | pylint: disable=protected-access
+            self.auth._setup_credentials()
+        client = self.orig_get_client()
+        assert client.algorithm == self.auth.ALGORITHMS["HMAC-MD5"]
+        assert client.sign_query is True
+
+    def test_get_client_reused(self):
+        creds = { "server": SERVER, "port": PORT, "name": NAME, "secret": SECRET }
+        self.auth.credentials = mock.MagicMock()
+        self.auth.credentials.conf = lambda key: creds.get(key, None)
+
+        assert self.orig_get_client() is self.orig_get_client()
+
+    def test_parse_config_defaults(self):
+        # _setup_credentials | pylint: disable=protected-access
+        self.auth._setup_credentials()
+
+        assert self.auth.follow is False
+        assert self.auth.depth == 1
+
+    def test_parse_config_follow_depth(self):
+        self.config.rfc2136_follow = True
+        self.config.rfc2136_depth = '3'
+        # _setup_credentials | pylint: disable=protected-access
+        self.auth._setup_credentials()
+
+        assert self.auth.follow is True
+        assert self.auth.depth == 3
+
+    def test_parse_config_auto_depth(self):
+        from certbot_dns_rfc2136_cname._internal.dns_rfc2136 import AUTO_CNAME_DEPTH
+
+        self.config.rfc2136_depth = 'AUTO'
+        # _setup_credentials | pylint: disable=protected-access
+        self.auth._setup_credentials()
+
+        assert self.auth.depth == AUTO_CNAME_DEPTH
+
+    def test_parse_config_invalid_depth_raises(self):
+        for depth in ('0', 'deep'):
+            self.config.rfc2136_depth = depth
+            with pytest.raises(errors.PluginError):
+                # _setup_credentials | pylint: disable=protected-access
+                self.auth._setup_credentials()
+
     @test_util.patch_display_util()
     def test_perform(self, unused_mock_get_utility):
         self.auth.perform([self.achall])
 
-        expected = [mock.call.add_txt_record('_acme-challenge.'+DOMAIN, mock.ANY, mock.ANY)]
+        expected = [mock.call.add_txt_records([('_acme-challenge.'+DOMAIN, mock.ANY)], mock.ANY),
+                    mock.call.close()]
         assert expected == self.mock_client.mock_calls
 
     def test_cleanup(self):
@@ -67,7 +128,24 @@ class AuthenticatorTest(test_util.TempDirTestCase, dns_test_common.BaseAuthentic
         self.auth._attempt_cleanup = True
         self.auth.cleanup([self.achall])
 
-        expected = [mock.call.del_txt_record('_acme-challenge.'+DOMAIN, mock.ANY)]
+        expected = [mock.call.del_txt_records([('_acme-challenge.'+DOMAIN, mock.ANY)]),
+                    mock.call.close()]
+        assert expected == self.mock_client.mock_calls
+
+    def test_perform_single_record(self):
+        # _perform | pylint: disable=protected-access
+        self.auth._perform(DOMAIN, '_acme-challenge.'+DOMAIN, 'foo')
+
+        expected = [mock.call.add_txt_record('_acme-challenge.'+DOMAIN, 'foo', mock.ANY),
+                    mock.call.close()]
+        assert expected == self.mock_client.mock_calls
+
+    def test_cleanup_single_record(self):
+        # _cleanup | pylint: disable=protected-access
+        self.auth._cleanup(DOMAIN, '_acme-challenge.'+DOMAIN, 'foo')
+
+        expected = [mock.call.del_txt_record('_acme-challenge.'+DOMAIN, 'foo'),
+                    mock.call.close()]
         assert expected == self.mock_client.mock_calls
 
     def test_invalid_algorithm_raises(self):
@@ -120,28 +198,34 @@ class RFC2136ClientTest(unittest.TestCase):
         self.rfc2136_client = _RFC2136Client(SERVER, PORT, NAME, SECRET, dns.tsig.HMAC_MD5,
         False, False, 0, TIMEOUT)
 
+        patcher = mock.patch("socket.create_connection")
+        self.create_connection_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _patch_client(self, attribute, value):
+        # _RFC2136Client uses __slots__, so methods can only be replaced on the class
+        patcher = mock.patch.object(type(self.rfc2136_client), attribute, value)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     @mock.patch("dns.query.tcp")
     def test_add_txt_record(self, query_mock):
         query_mock.return_value.rcode.return_value = dns.rcode.NOERROR
         # _find_domain | pylint: disable=protected-access
-        # workaround for wont-fix https://github.com/python/mypy/issues/2427 that works with
-        # both strict and non-strict mypy
-        setattr(self.rfc2136_client, '_find_domain',
-                mock.MagicMock(side_effect=lambda record_name: ("example.com", record_name)))
+        self._patch_client('_find_domain', mock.MagicMock(
+            side_effect=lambda record_name: ("example.com", record_name)))
 
         self.rfc2136_client.add_txt_record("bar", "baz", 42)
 
-        query_mock.assert_called_with(mock.ANY, SERVER, TIMEOUT, PORT)
+        query_mock.assert_called_with(mock.ANY, SERVER, TIMEOUT, PORT, sock=mock.ANY)
         assert 'bar. 42 IN TXT "baz"' in str(query_mock.call_args[0][0])
 
     @mock.patch("dns.query.tcp")
     def test_add_txt_record_wraps_errors(self, query_mock):
         query_mock.side_effect = Exception
         # _find_domain | pylint: disable=protected-access
-        # workaround for wont-fix https://github.com/python/mypy/issues/2427 that works with
-        # both strict and non-strict mypy
-        setattr(self.rfc2136_client, '_find_domain',
-                mock.MagicMock(side_effect=lambda record_name: ("example.com", record_name)))
+        self._patch_client('_find_domain', mock.MagicMock(
+            side_effect=lambda record_name: ("example.com", record_name)))
 
         with pytest.raises(errors.PluginError):
             self.rfc2136_client.add_txt_record("bar", "baz", 42)
@@ -150,10 +234,8 @@ class RFC2136ClientTest(unittest.TestCase):
     def test_add_txt_record_server_error(self, query_mock):
         query_mock.return_value.rcode.return_value = dns.rcode.NXDOMAIN
         # _find_domain | pylint: disable=protected-access
-        # workaround for wont-fix https://github.com/python/mypy/issues/2427 that works with
-        # both strict and non-strict mypy
-        setattr(self.rfc2136_client, '_find_domain',
-                mock.MagicMock(side_effect=lambda record_name: ("example.com", record_name)))
+        self._patch_client('_find_domain', mock.MagicMock(
+            side_effect=lambda record_name: ("example.com", record_name)))
 
         with pytest.raises(errors.PluginError):
             self.rfc2136_client.add_txt_record("bar", "baz", 42)
@@ -162,24 +244,20 @@ class RFC2136ClientTest(unittest.TestCase):
     def test_del_txt_record(self, query_mock):
         query_mock.return_value.rcode.return_value = dns.rcode.NOERROR
         # _find_domain | pylint: disable=protected-access
-        # workaround for wont-fix https://github.com/python/mypy/issues/2427 that works with
-        # both strict and non-strict mypy
-        setattr(self.rfc2136_client, '_find_domain',
-                mock.MagicMock(side_effect=lambda record_name: ("example.com", record_name)))
+        self._patch_client('_find_domain', mock.MagicMock(
+            side_effect=lambda record_name: ("example.com", record_name)))
 
         self.rfc2136_client.del_txt_record("bar", "baz")
 
-        query_mock.assert_called_with(mock.ANY, SERVER, TIMEOUT, PORT)
+        query_mock.assert_called_with(mock.ANY, SERVER, TIMEOUT, PORT, sock=mock.ANY)
         assert 'bar. 0 NONE TXT "baz"' in str(query_mock.call_args[0][0])
 
     @mock.patch("dns.query.tcp")
     def test_del_txt_record_wraps_errors(self, query_mock):
         query_mock.side_effect = Exception
         # _find_domain | pylint: disable=protected-access
-        # workaround for wont-fix https://github.com/python/mypy/issues/2427 that works with
-        # both strict and non-strict mypy
-        setattr(self.rfc2136_client, '_find_domain',
-                mock.MagicMock(side_effect=lambda record_name: ("example.com", record_name)))
+        self._patch_client('_find_domain', mock.MagicMock(
+            side_effect=lambda record_name: ("example.com", record_name)))
 
         with pytest.raises(errors.PluginError):
             self.rfc2136_client.del_txt_record("bar", "baz")
@@ -188,30 +266,215 @@ class RFC2136ClientTest(unittest.TestCase):
     def test_del_txt_record_server_error(self, query_mock):
         query_mock.return_value.rcode.return_value = dns.rcode.NXDOMAIN
         # _find_domain | pylint: disable=protected-access
-        # workaround for wont-fix https://github.com/python/mypy/issues/2427 that works with
-        # both strict and non-strict mypy
-        setattr(self.rfc2136_client, '_find_domain',
-                mock.MagicMock(side_effect=lambda record_name: ("example.com", record_name)))
+        self._patch_client('_find_domain', mock.MagicMock(
+            side_effect=lambda record_name: ("example.com", record_name)))
 
         with pytest.raises(errors.PluginError):
             self.rfc2136_client.del_txt_record("bar", "baz")
 
+    @mock.patch("dns.query.tcp")
+    def test_add_txt_records(self, query_mock):
+        query_mock.return_value.rcode.return_value = dns.rcode.NOERROR
+        # _find_domain | pylint: disable=protected-access
+        self._patch_client('_find_domain', mock.MagicMock(
+            side_effect=lambda record_name: (record_name.split('.', 1)[1], record_name)))
+
+        self.rfc2136_client.add_txt_records([("foo.example.com", "baz"),
+                                             ("bar.example.com", "qux"),
+                                             ("foo.example.org", "quux")], 42)
+
+        assert query_mock.call_count == 2
+        first, second = (call[0][0] for call in query_mock.call_args_list)
+        assert 'foo 42 IN TXT "baz"' in str(first)
+        assert 'bar 42 IN TXT "qux"' in str(first)
+        assert 'foo 42 IN TXT "quux"' in str(second)
+
+    @mock.patch("dns.query.tcp")
+    def test_add_txt_records_refused(self, query_mock):
+        query_mock.return_value.rcode.side_effect = [dns.rcode.REFUSED,
+                                                     dns.rcode.NOERROR, dns.rcode.NOERROR]
+        # _find_domain | pylint: disable=protected-access
+        self._patch_client('_find_domain', mock.MagicMock(
+            side_effect=lambda record_name: ("example.com", record_name)))
+
+        self.rfc2136_client.add_txt_records([("foo", "baz"), ("bar", "qux")], 42)
+
+        assert query_mock.call_count == 3
+        assert 'foo. 42 IN TXT "baz"' in str(query_mock.call_args_list[1][0][0])
+        assert 'bar. 42 IN TXT "qux"' in str(query_mock.call_args_list[2][0][0])
+
+    @mock.patch("dns.query.tcp")
+    def test_del_txt_records_refused_tries_every_record(self, query_mock):
+        query_mock.return_value.rcode.side_effect = [dns.rcode.REFUSED,
+                                                     dns.rcode.REFUSED, dns.rcode.NOERROR]
+        # _find_domain | pylint: disable=protected-access
+        self._patch_client('_find_domain', mock.MagicMock(
+            side_effect=lambda record_name: ("example.com", record_name)))
+
+        with pytest.raises(errors.PluginError) as excinfo:
+            self.rfc2136_client.del_txt_records([("foo", "baz"), ("bar", "qux")])
+
+        assert query_mock.call_count == 3
+        assert 'bar. 0 NONE TXT "qux"' in str(query_mock.call_args_list[2][0][0])
+        assert 'foo' in str(excinfo.value)
+        assert 'bar' not in str(excinfo.value)
+
+    @mock.patch("dns.query.tcp")
+    def test_add_txt_records_server_error(self, query_mock):
+        query_mock.return_value.rcode.return_value = dns.rcode.REFUSED
+        # _find_domain | pylint: disable=protected-access
+        self._patch_client('_find_domain', mock.MagicMock(
+            side_effect=lambda record_name: ("example.com", record_name)))
+
+        with pytest.raises(errors.PluginError):
+            self.rfc2136_client.add_txt_records([("bar", "baz")], 42)
+
+    @mock.patch("dns.query.tcp")
+    def test_add_txt_records_wraps_errors(self, query_mock):
+        query_mock.side_effect = Exception
+        # _find_domain | pylint: disable=protected-access
+        self._patch_client('_find_domain', mock.MagicMock(
+            side_effect=lambda record_name: ("example.com", record_name)))
+
+        with pytest.raises(errors.PluginError):
+            self.rfc2136_client.add_txt_records([("bar", "baz")], 42)
+
+    @mock.patch("dns.query.tcp")
+    def test_del_txt_records(self, query_mock):
+        query_mock.return_value.rcode.return_value = dns.rcode.NOERROR
+        # _find_domain | pylint: disable=protected-access
+        self._patch_client('_find_domain', mock.MagicMock(
+            side_effect=lambda record_name: ("example.com", record_name)))
+
+        self.rfc2136_client.del_txt_records([("foo", "baz"), ("bar", "qux")])
+
+        query_mock.assert_called_once_with(mock.ANY, SERVER, TIMEOUT, PORT, sock=mock.ANY)
+        assert 'foo. 0 NONE TXT "baz"' in str(query_mock.call_args[0][0])
+        assert 'bar. 0 NONE TXT "qux"' in str(query_mock.call_args[0][0])
+
+    @mock.patch("dns.query.tcp")
+    def test_del_txt_records_refused(self, query_mock):
+        query_mock.return_value.rcode.side_effect = [dns.rcode.REFUSED,
+                                                     dns.rcode.NOERROR, dns.rcode.NOERROR]
+        # _find_domain | pylint: disable=protected-access
+        self._patch_client('_find_domain', mock.MagicMock(
+            side_effect=lambda record_name: ("example.com", record_name)))
+
+        self.rfc2136_client.del_txt_records([("foo", "baz"), ("bar", "qux")])
+
+        assert query_mock.call_count == 3
+
+    @mock.patch("dns.query.tcp")
+    def test_del_txt_records_wraps_errors(self, query_mock):
+        query_mock.side_effect = Exception
+        # _find_domain | pylint: disable=protected-access
+        self._patch_client('_find_domain', mock.MagicMock(
+            side_effect=lambda record_name: ("example.com", record_name)))
+
+        with pytest.raises(errors.PluginError):
+            self.rfc2136_client.del_txt_records([("bar", "baz")])
+
     def test_find_domain(self):
         # _query_soa | pylint: disable=protected-access
-        # workaround for wont-fix https://github.com/python/mypy/issues/2427 that works with
-        # both strict and non-strict mypy
-        setattr(self.rfc2136_client, '_query_soa', mock.MagicMock(side_effect=[False, False, True]))
+        self._patch_client('_query_soa', mock.MagicMock(side_effect=[False, False, True]))
 
         # _find_domain | pylint: disable=protected-access
         domain, name = self.rfc2136_client._find_domain('foo.bar.'+DOMAIN)
 
         assert domain == DOMAIN
 
+    @mock.patch("dns.query.tcp")
+    def test_find_domain_ignores_authority_after_cname(self, query_mock):
+        # The server chased an in-zone CNAME, so the authority SOA is the target's zone
+        name = '_acme-challenge.sub.'+DOMAIN
+        request = dns.message.make_query(name, 'SOA')
+        chased = dns.message.make_response(request)
+        chased.flags |= dns.flags.AA
+        chased.answer.append(dns.rrset.from_text(name+'.', 300, 'IN', 'CNAME',
+                                                 'acme.'+DOMAIN+'.'))
+        chased.authority.append(dns.rrset.from_text(DOMAIN+'.', 300, 'IN', 'SOA',
+                                                    'ns. host. 1 2 3 4 5'))
+        apex = dns.message.make_response(dns.message.make_query('sub.'+DOMAIN, 'SOA'))
+        apex.flags |= dns.flags.AA
+        apex.find_rrset(apex.answer, apex.question[0].name, dns.rdataclass.IN,
+                        dns.rdatatype.SOA, create=True).update(
+            dns.rrset.from_text('sub.'+DOMAIN+'.', 300, 'IN', 'SOA', 'ns. host. 1 2 3 4 5'))
+        query_mock.side_effect = [chased, apex]
+
+        # _find_domain | pylint: disable=protected-access
+        domain, _ = self.rfc2136_client._find_domain(name)
+
+        assert domain == 'sub.'+DOMAIN
+        assert query_mock.call_count == 2
+
+    def test_find_domain_prefers_delegated_zone(self):
+        # Both the parent and the delegated child zone are served, the child must win
+        zones = {'bar.'+DOMAIN, DOMAIN}
+        # _query_soa | pylint: disable=protected-access
+        self._patch_client('_query_soa', mock.MagicMock(side_effect=lambda guess: guess in zones))
+
+        # _find_domain | pylint: disable=protected-access
+        domain, _ = self.rfc2136_client._find_domain('foo.bar.'+DOMAIN)
+
+        assert domain == 'bar.'+DOMAIN
+
+    def test_find_domain_cached(self):
+        # _query_soa | pylint: disable=protected-access
+        query_soa = mock.MagicMock(side_effect=[False, False, True])
+        self._patch_client('_query_soa', query_soa)
+
+        # _find_domain | pylint: disable=protected-access
+        first = self.rfc2136_client._find_domain('foo.bar.'+DOMAIN)
+        second = self.rfc2136_client._find_domain('foo.bar.'+DOMAIN)
+
+        assert first == second == (DOMAIN, 'foo.bar.'+DOMAIN)
+        assert query_soa.call_count == 3
+
+    @mock.patch("dns.query.tcp")
+    def test_find_domain_from_negative_response(self, query_mock):
+        request = dns.message.make_query('foo.bar.'+DOMAIN, 'SOA')
+        response = dns.message.make_response(request)
+        response.flags |= dns.flags.AA
+        response.set_rcode(dns.rcode.NXDOMAIN)
+        response.authority.append(dns.rrset.from_text(DOMAIN+'.', 300, 'IN', 'SOA',
+                                                       'ns. host. 1 2 3 4 5'))
+        query_mock.return_value = response
+
+        # _find_domain | pylint: disable=protected-access
+        domain, name = self.rfc2136_client._find_domain('foo.bar.'+DOMAIN)
+
+        assert (domain, name) == (DOMAIN, 'foo.bar.'+DOMAIN)
+        assert query_mock.call_count == 1
+
+    @mock.patch("dns.query.tcp")
+    def test_failed_update_forgets_zone(self, query_mock):
+        query_mock.return_value.rcode.return_value = dns.rcode.NOTZONE
+        # _query_soa | pylint: disable=protected-access
+        query_soa = mock.MagicMock(side_effect=[False, False, True, False, False, True])
+        self._patch_client('_query_soa', query_soa)
+
+        with pytest.raises(errors.PluginError):
+            self.rfc2136_client.add_txt_record('foo.bar.'+DOMAIN, "baz", 42)
+        with pytest.raises(errors.PluginError):
+            self.rfc2136_client.del_txt_record('foo.bar.'+DOMAIN, "baz")
+
+        assert query_soa.call_count == 6
+
+    @mock.patch("dns.query.tcp")
+    def test_failed_update_forgets_soa_lookups(self, query_mock):
+        query_mock.return_value.rcode.return_value = dns.rcode.NOTZONE
+        # _soa_cache | pylint: disable=protected-access
+        self.rfc2136_client._soa_cache.update({'foo.bar.'+DOMAIN: False, 'bar.'+DOMAIN: False,
+                                               DOMAIN: True, 'other.org': True})
+
+        with pytest.raises(errors.PluginError):
+            self.rfc2136_client.add_txt_record('foo.bar.'+DOMAIN, "baz", 42)
+
+        assert self.rfc2136_client._soa_cache == {'other.org': True}
+
     def test_find_domain_wraps_errors(self):
         # _query_soa | pylint: disable=protected-access
-        # workaround for wont-fix https://github.com/python/mypy/issues/2427 that works with
-        # both strict and non-strict mypy
-        setattr(self.rfc2136_client, '_query_soa', mock.MagicMock(return_value=False))
+        self._patch_client('_query_soa', mock.MagicMock(return_value=False))
 
         with pytest.raises(errors.PluginError):
             self.rfc2136_client._find_domain('foo.bar.'+DOMAIN)
@@ -226,7 +489,7 @@ class RFC2136ClientTest(unittest.TestCase):
         # _query_soa | pylint: disable=protected-access
         result = self.rfc2136_client._query_soa(DOMAIN)
 
-        query_mock.assert_called_with(mock.ANY, SERVER, TIMEOUT, PORT)
+        query_mock.assert_called_with(mock.ANY, SERVER, TIMEOUT, PORT, sock=mock.ANY)
         mock_make_query.return_value.use_tsig.assert_not_called()
         assert result
 
@@ -237,9 +500,18 @@ class RFC2136ClientTest(unittest.TestCase):
         # _query_soa | pylint: disable=protected-access
         result = self.rfc2136_client._query_soa(DOMAIN)
 
-        query_mock.assert_called_with(mock.ANY, SERVER, TIMEOUT, PORT)
+        query_mock.assert_called_with(mock.ANY, SERVER, TIMEOUT, PORT, sock=mock.ANY)
         assert not result
 
+    @mock.patch("dns.query.tcp")
+    def test_query_soa_without_recursion(self, query_mock):
+        query_mock.return_value.rcode.return_value = dns.rcode.NXDOMAIN
+
+        # _query_soa | pylint: disable=protected-access
+        self.rfc2136_client._query_soa(DOMAIN)
+
+        assert not query_mock.call_args[0][0].flags & dns.flags.RD
+
     @mock.patch("dns.query.tcp")
     def test_query_soa_wraps_errors(self, query_mock):
         query_mock.side_effect = Exception
@@ -247,19 +519,82 @@ class RFC2136ClientTest(unittest.TestCase):
         with pytest.raises(errors.PluginError):
             self.rfc2136_client._query_soa(DOMAIN)
 
+    @mock.patch("dns.query.tcp")
+    def test_query_soa_cached(self, query_mock):
+        query_mock.return_value = mock.MagicMock(answer=[mock.MagicMock()], flags=dns.flags.AA)
+        query_mock.return_value.rcode.return_value = dns.rcode.NOERROR
+
+        # _query_soa | pylint: disable=protected-access
+        assert self.rfc2136_client._query_soa(DOMAIN)
+        assert self.rfc2136_client._query_soa(DOMAIN)
+
+        assert query_mock.call_count == 1
+
+    @mock.patch("dns.query.tcp")
+    def test_query_soa_errors_not_cached(self, query_mock):
+        query_mock.side_effect = [Exception, mock.DEFAULT]
+        query_mock.return_value.rcode.return_value = dns.rcode.NXDOMAIN
+
+        with pytest.raises(errors.PluginError):
+            self.rfc2136_client._query_soa(DOMAIN)
+        # _query_soa | pylint: disable=protected-access
+        assert not self.rfc2136_client._query_soa(DOMAIN)
+
+        assert query_mock.call_count == 2
+
+    @mock.patch("dns.query.tcp")
+    def test_send_tcp_reuses_connection(self, query_mock):
+        # _send_tcp | pylint: disable=protected-access
+        self.rfc2136_client._send_tcp(mock.MagicMock())
+        self.rfc2136_client._send_tcp(mock.MagicMock())
+
+        self.create_connection_mock.assert_called_once_with((SERVER, PORT), TIMEOUT)
+        query_mock.assert_called_with(mock.ANY, SERVER, TIMEOUT, PORT,
+                                      sock=self.create_connection_mock.return_value)
+
+    @mock.patch("dns.query.tcp")
+    def test_send_tcp_reconnects(self, query_mock):
+        first, second = mock.MagicMock(), mock.MagicMock()
+        self.create_connection_mock.side_effect = [first, second]
+        query_mock.side_effect = [mock.DEFAULT, EOFError, mock.DEFAULT]
+
+        # _send_tcp | pylint: disable=protected-access
+        self.rfc2136_client._send_tcp(mock.MagicMock())
+        self.rfc2136_client._send_tcp(mock.MagicMock())
+
+        first.close.assert_called_once_with()
+        query_mock.assert_called_with(mock.ANY, SERVER, TIMEOUT, PORT, sock=second)
+
+    @mock.patch("dns.query.tcp")
+    def test_send_tcp_does_not_retry_new_connection(self, query_mock):
+        query_mock.side_effect = EOFError
+
+        with pytest.raises(EOFError):
+            # _send_tcp | pylint: disable=protected-access
+            self.rfc2136_client._send_tcp(mock.MagicMock())
+
+        assert query_mock.call_count == 1
+        self.create_connection_mock.return_value.close.assert_called_once_with()
+
+    @mock.patch("dns.query.tcp")
+    def test_close(self, unused_query_mock):
+        # _send_tcp | pylint: disable=protected-access
+        self.rfc2136_client._send_tcp(mock.MagicMock())
+        self.rfc2136_client.close()
+        self.rfc2136_client.close()
+
+        self.create_connection_mock.return_value.close.assert_called_once_with()
+
     @mock.patch("dns.query.udp")
     @mock.patch("dns.query.tcp")
-    def test_query_soa_fallback_to_udp(self, tcp_mock, udp_mock):
+    def test_query_soa_no_fallback_to_udp(self, tcp_mock, udp_mock):
         tcp_mock.side_effect = OSError
-        udp_mock.return_value = mock.MagicMock(answer=[mock.MagicMock()], flags=dns.flags.AA)
-        udp_mock.return_value.rcode.return_value = dns.rcode.NOERROR
 
-        # _query_soa | pylint: disable=protected-access
-        result = self.rfc2136_client._query_soa(DOMAIN)
+        with pytest.raises(errors.PluginError):
+            # _query_soa | pylint: disable=protected-access
+            self.rfc2136_client._query_soa(DOMAIN)
 
-        tcp_mock.assert_called_with(mock.ANY, SERVER, TIMEOUT, PORT)
-        udp_mock.assert_called_with(mock.ANY, SERVER, TIMEOUT, PORT)
-        assert result
+        udp_mock.assert_not_called()
 
     @mock.patch("dns.query.tcp")
     @mock.patch("dns.message.make_query")
@@ -27,18 +27,60 @@ def test_find_domain_with_single_cname(monkeypatch):
     client = _RFC2136Client(SERVER, PORT, NAME, SECRET, dns.tsig.HMAC_MD5,
         False, True, 5)
 
-    monkeypatch.setattr('dns.resolver.resolve', lambda name, rdtype: make_txt_answer('real._acme-challenge.example.com') if name == '_acme-challenge.example.com' else make_no_answer())
-    monkeypatch.setattr(client, '_query_soa', lambda domain: True)
+    client._resolver = mock.Mock(resolve=lambda name, rdtype, **kwargs: make_txt_answer('real._acme-challenge.example.com') if name == '_acme-challenge.example.com' else make_no_answer())
+    monkeypatch.setattr(_RFC2136Client, '_query_soa', lambda self, domain: True)
 
     zone, record = client._find_domain('_acme-challenge.example.com')
     assert record == 'real._acme-challenge.example.com'
     assert zone == 'real._acme-challenge.example.com'
 
+def test_resolver_is_cached_and_bounded():
+    client = _RFC2136Client(SERVER, PORT, NAME, SECRET, dns.tsig.HMAC_MD5,
+        False, True, 5, 10)
+
+    resolver = client._get_resolver()
+    assert isinstance(resolver.cache, dns.resolver.LRUCache)
+    assert resolver.cache.max_size == 256
+    assert resolver.lifetime == 2.0
+    assert resolver.timeout == 2.0
+    assert client._get_resolver() is resolver
+
+def test_resolver_lifetime_is_share_of_timeout():
+    client = _RFC2136Client(SERVER, PORT, NAME, SECRET, dns.tsig.HMAC_MD5,
+        False, True, 10, 45)
+
+    resolver = client._get_resolver()
+    assert resolver.lifetime == 4.5
+    assert resolver.timeout == 2.0
+
+def test_find_domain_without_follow_skips_resolver(monkeypatch):
+    client = _RFC2136Client(SERVER, PORT, NAME, SECRET, dns.tsig.HMAC_MD5,
+        False, False, 0)
+
+    monkeypatch.setattr('dns.resolver.Resolver', mock.Mock(
+        side_effect=dns.resolver.NoResolverConfiguration))
+    monkeypatch.setattr(_RFC2136Client, '_query_soa', lambda self, domain: True)
+
+    zone, record = client._find_domain('_acme-challenge.example.com')
+    assert record == '_acme-challenge.example.com'
+    assert client._resolver is None
+
+def test_find_domain_without_resolver_configuration(monkeypatch):
+    client = _RFC2136Client(SERVER, PORT, NAME, SECRET, dns.tsig.HMAC_MD5,
+        False, True, 5)
+
+    monkeypatch.setattr('dns.resolver.Resolver', mock.Mock(
+        side_effect=dns.resolver.NoResolverConfiguration))
+    monkeypatch.setattr(_RFC2136Client, '_query_soa', lambda self, domain: True)
+
+    zone, record = client._find_domain('_acme-challenge.example.com')
+    assert record == '_acme-challenge.example.com'
+
 def test_find_domain_with_cname_loop(monkeypatch):
     client = _RFC2136Client(SERVER, PORT, NAME, SECRET, dns.tsig.HMAC_MD5,
         False, True, 0)
 
-    def loop_cname(name, rdtype):
+    def loop_cname(name, rdtype, **kwargs):
         if name == '_acme-challenge.example.com':
             return make_txt_answer('_acme-challenge2.example.com')
         elif name == '_acme-challenge2.example.com':
@@ -46,24 +88,42 @@ def test_find_domain_with_cname_loop(monkeypatch):
         else:
             return make_no_answer()
 
-    monkeypatch.setattr('dns.resolver.resolve', loop_cname)
+    client._resolver = mock.Mock(resolve=loop_cname)
 
     with pytest.raises(Exception) as excinfo:
         client._find_domain('_acme-challenge.example.com')
     assert "loop" in str(excinfo.value)
 
+def test_find_domain_with_mixed_case_cname_loop(monkeypatch):
+    client = _RFC2136Client(SERVER, PORT, NAME, SECRET, dns.tsig.HMAC_MD5,
+        False, True, 0)
+
+    def loop_cname(name, rdtype, **kwargs):
+        if name.lower() == '_acme-challenge.example.com':
+            return make_txt_answer('_ACME-Challenge2.Example.COM')
+        elif name.lower() == '_acme-challenge2.example.com':
+            return make_txt_answer('_Acme-Challenge.EXAMPLE.com')
+        else:
+            return make_no_answer()
+
+    client._resolver = mock.Mock(resolve=loop_cname)
+
+    with pytest.raises(PluginError) as excinfo:
+        client._find_domain('_acme-challenge.example.com')
+    assert "loop" in str(excinfo.value)
+
 def test_find_domain_max_depth(monkeypatch):
     client = _RFC2136Client(SERVER, PORT, NAME, SECRET, dns.tsig.HMAC_MD5,
         False, True, 1)
 
-    def one_cname(name, rdtype):
+    def one_cname(name, rdtype, **kwargs):
         if name == '_acme-challenge.example.com':
             return make_txt_answer('_acme-challenge2.example.com')
         else:
             return make_txt_answer('_acme-challenge3.example.com')
 
-    monkeypatch.setattr('dns.resolver.resolve', one_cname)
-    monkeypatch.setattr(client, '_query_soa', lambda domain: True)
+    client._resolver = mock.Mock(resolve=one_cname)
+    monkeypatch.setattr(_RFC2136Client, '_query_soa', lambda self, domain: True)
 
     with pytest.raises(PluginError) as excinfo:
         client._find_domain('_acme-challenge.example.com')
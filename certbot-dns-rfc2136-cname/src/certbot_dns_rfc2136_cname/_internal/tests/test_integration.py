@@ -14,7 +14,7 @@ def test_real_dns_cname_following(monkeypatch):
     client = _RFC2136Client(SERVER, PORT, NAME, SECRET, dns.tsig.HMAC_MD5,
         False, True, 1)
 
-    monkeypatch.setattr(client, '_query_soa', mock.MagicMock(side_effect=[False, True]))
+    monkeypatch.setattr(_RFC2136Client, '_query_soa', mock.MagicMock(side_effect=[False, True]))
 
     validation_name = '_acme-challenge.algonova-it.de'  # Choose a known CNAME domain!
 